@@ -2,6 +2,7 @@
 
 import os
 import sys
+import re
 import json
 import argparse
 import subprocess
@@ -9,6 +10,9 @@ import subprocess
 from time import sleep
 
 CONFIG_PATH = "/etc/govctl/config.json"
+STATE_PATH = "/run/govctl/current"
+
+GOV_RE = re.compile(rb'Applied governor "([^"]+)"')
 
 
 def load_config() -> None:
@@ -17,8 +21,13 @@ def load_config() -> None:
 
 
 def save_config(config) -> None:
-    with open(CONFIG_PATH, "w") as f:
+    # Replace the file atomically so the service never reads a partial write
+    tmp_path = CONFIG_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
         json.dump(config, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, CONFIG_PATH)
 
 
 def check_root() -> None:
@@ -29,12 +38,17 @@ def check_root() -> None:
 
 def get_cur_gov() -> None:
     try:
-        output = subprocess.check_output(["systemctl", "status", "govctl"], text=True)
-        last_lines = output.strip().splitlines()[-30:]
-        last_lines.reverse()
-        for line in last_lines:
-            if "Applied governor" in line:
-                return line[line.find('governor "') + 10 : -1]
+        with open(STATE_PATH, "r") as f:
+            return f.read().strip()
+    except OSError:
+        pass
+
+    # Older services only report it in the journal
+    try:
+        output = subprocess.check_output(["systemctl", "status", "govctl"])
+        matches = GOV_RE.findall(output)
+        if matches:
+            return matches[-1].decode()
     except:
         pass
 
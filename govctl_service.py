@@ -1,17 +1,22 @@
 #!/usr/bin/env python3
 
-import json, os, time, logging, signal, subprocess
-import shutil, re
+import json, os, sys, errno, time, logging, signal, subprocess
+import importlib.machinery, importlib.util
+import mmap, select, socket, struct, ctypes, contextlib, io
+from dataclasses import dataclass
 from pathlib import Path
 import logging.handlers
 
 CONFIG_PATH = "/etc/govctl/config.json"
+STATE_PATH = "/run/govctl/current"
 LOG_TAG = "govctl"
 RAPLCTL_PATH = "/usr/bin/raplctl"
 RYZENADJ_PATH = "/usr/bin/ryzenadj"
+RYZENADJ_LIB = "libryzenadj.so"
 
 VALID_CPU_GOVS = ["powersave", "conservative", "performance"]
 VALID_DEVFREQ_GOVS = ["powersave", "performance"]
+GOV_BYTES = {gov: gov.encode() for gov in VALID_CPU_GOVS}
 
 # Intel Constants
 INTEL_MSR_PKG_POWER_LIMIT = 0x610
@@ -23,8 +28,8 @@ INTEL_PL1_PL2_ENABLE_BITS = INTEL_PL1_ENABLE_BITS_LOW | (
     INTEL_PL2_ENABLE_BITS_HIGH << 32
 )
 
-PL_UNCAP_REQUIRED_TOOLS = ["devmem2", "rdmsr", "wrmsr", "turbostat", "setpci"]
-PL_UNCAP_MISSING = [tool for tool in PL_UNCAP_REQUIRED_TOOLS if not shutil.which(tool)]
+MSR_PATH = "/dev/cpu/0/msr"
+HOST_BRIDGE_CONFIG = "/sys/bus/pci/devices/0000:00:00.0/config"
 
 isi = False  # Is Intel
 isa = False  # Is AMD
@@ -32,10 +37,12 @@ isa = False  # Is AMD
 isx = os.uname().machine == "x86_64"  # Is x86_64
 if isx:
     try:
-        with open("/proc/cpuinfo", "r") as f:
-            data = f.read()
-            isi = "GenuineIntel" in data
-            isa = "AuthenticAMD" in data
+        # vendor_id is in the first processor block, no need to read
+        # and decode the whole file on many-core machines
+        with open("/proc/cpuinfo", "rb") as f:
+            data = f.read(4096)
+            isi = b"GenuineIntel" in data
+            isa = b"AuthenticAMD" in data
     except Exception:
         pass  # Ignore errors if /proc/cpuinfo is not available
 
@@ -56,6 +63,14 @@ if isx:
 CPU_GOVERNOR_PATH = "/sys/devices/system/cpu/cpu*/cpufreq/scaling_governor"
 DEVFREQ_GOVERNOR_PATH = "/sys/class/devfreq/*/governor"
 BATTERY_PATH = "/sys/class/power_supply/"
+# inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+INOTIFY_EVENT = struct.Struct("iIII")
+
+NETLINK_KOBJECT_UEVENT = 15
+# Safety net for batteries that do not emit uevents on capacity changes
+UEVENT_PERIOD = 300
 
 logging.basicConfig(
     level=logging.INFO,
@@ -71,52 +86,273 @@ logging.basicConfig(
 current_config = {}
 force_show = True
 powersave = False
-applied_tdp = None
-last_config_mtime = 0
+_gov_state: dict[str, str] = {}  # Last governor written per sysfs path
+_cpu_attrs: list["SysfsAttr"] = []
+_devfreq_attrs: list["SysfsAttr"] = []
+_gov_available: dict[str, list[bytes]] = {}  # Supported governors per path
+_last_applied = None
+_tdp_applied = None  # Governor the TDP tools last ran for
+_battery_devs: list["BatteryDev"] | None = None
+_last_status = None
+_last_status_ts = 0.0
+_wake_r, _wake_w = -1, -1  # Signal wakeup pipe
+_inotify_fd = -1
+_uevent_sock: socket.socket | None = None
+_epoll: select.epoll | None = None
+_ryzenadj = None  # (libryzenadj, handle) once loaded, False if unavailable
+_raplctl = None  # raplctl module once loaded, False if unavailable
+
+
+class SysfsAttr:
+    # A sysfs attribute held open for the lifetime of the daemon, sysfs
+    # regenerates the value on every read at offset 0
+    __slots__ = ("path", "flags", "fd")
+
+    def __init__(self, path: str, flags: int = os.O_RDONLY) -> None:
+        self.path = path
+        self.flags = flags | os.O_CLOEXEC
+        self.fd = os.open(path, self.flags)
+
+    def _reopen(self) -> None:
+        # The device went away and came back, the old fd is dead
+        self.close()
+        self.fd = os.open(self.path, self.flags)
+
+    def read(self) -> bytes:
+        try:
+            return os.pread(self.fd, 64, 0).strip()
+        except OSError as e:
+            if e.errno != errno.ENODEV:
+                raise
+            self._reopen()
+            return os.pread(self.fd, 64, 0).strip()
+
+    def write(self, value: bytes) -> None:
+        try:
+            os.pwrite(self.fd, value, 0)
+        except OSError as e:
+            if e.errno != errno.ENODEV:
+                raise
+            self._reopen()
+            os.pwrite(self.fd, value, 0)
+
+    def close(self) -> None:
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+@dataclass
+class BatteryDev:
+    # Batteries report either energy_* (uWh) or charge_* (uAh), now and full
+    # hold whichever pair the device has
+    path: str
+    online: SysfsAttr | None = None
+    now: SysfsAttr | None = None
+    full: SysfsAttr | None = None
+
+    def close(self) -> None:
+        for attr in (self.online, self.now, self.full):
+            if attr is not None:
+                attr.close()
+        self.online = self.now = self.full = None
 
 
 def load_config() -> None:
-    global current_config, last_config_mtime, force_show, applied_tdp
+    # Only called at startup, on SIGHUP and when inotify saw the file change
+    global current_config, force_show, _last_applied, _tdp_applied
     try:
-        config_path = Path(CONFIG_PATH)
-        if not config_path.exists():
-            return
-
-        # Check modification time
-        current_mtime = config_path.stat().st_mtime
+        with open(CONFIG_PATH, "r") as f:
+            current_config = json.load(f)
 
-        # Only reload if the time is different from the last load
-        if current_mtime != last_config_mtime:
-            with open(CONFIG_PATH, "r") as f:
-                current_config = json.load(f)
-            last_config_mtime = current_mtime
+        # Force re-application of settings
+        force_show = True
+        # Make set_governor run again, TDP limits included
+        _last_applied = None
+        _tdp_applied = None
 
-            # Force re-application of settings
-            force_show = True
-            # Reset applied_tdp to ensure raplctl/ryzenadj run again
-            applied_tdp = None
-
-            logging.info("Configuration reloaded due to file change")
+        logging.info("Configuration reloaded due to file change")
+    except FileNotFoundError:
+        pass
     except Exception as e:
         logging.error(f"Failed to load config: {e}")
 
 
-def run_raplctl(governor: str, tdps: dict) -> None:
-    global applied_tdp
-    if not (isi and Path(RAPLCTL_PATH).exists()):
-        return
+def _numbered_paths(base: str, prefix: str, attr: str) -> list[str]:
+    # Matches <base>/<prefix>N/<attr>, without glob's fnmatch and Path objects
+    try:
+        with os.scandir(base) as it:
+            return [
+                f"{entry.path}/{attr}"
+                for entry in it
+                if entry.name.startswith(prefix) and entry.name[len(prefix) :].isdigit()
+            ]
+    except FileNotFoundError:
+        return []
+
+
+def _open_gov_attrs(paths: list[str], available: str) -> list[SysfsAttr]:
+    attrs = []
+    for path in paths:
+        try:
+            attrs.append(SysfsAttr(path, os.O_RDWR))
+        except FileNotFoundError:
+            continue  # CPU without cpufreq, or offline
+        except OSError as e:
+            logging.error(f"Failed to open {path}: {e}")
+            continue
 
-    if applied_tdp == governor:
-        return
+        # Read the supported governors once instead of verifying every write
+        try:
+            _gov_available[path] = _read_attr(
+                os.path.join(os.path.dirname(path), available)
+            ).split()
+        except OSError:
+            pass
+    return attrs
+
+
+def _discover_paths() -> None:
+    global _cpu_attrs, _devfreq_attrs
+    # A policy covers every CPU sharing its clock, so prefer writing those
+    # over the per-cpu links into them
+    _cpu_attrs = _open_gov_attrs(
+        _numbered_paths("/sys/devices/system/cpu/cpufreq", "policy", "scaling_governor")
+        or _numbered_paths(
+            "/sys/devices/system/cpu", "cpu", "cpufreq/scaling_governor"
+        ),
+        "scaling_available_governors",
+    )
+    try:
+        devfreq = os.listdir("/sys/class/devfreq")
+    except FileNotFoundError:
+        devfreq = []
+    _devfreq_attrs = _open_gov_attrs(
+        [f"/sys/class/devfreq/{name}/governor" for name in devfreq],
+        "available_governors",
+    )
+
+
+def _close_gov_attrs() -> None:
+    for attr in _cpu_attrs + _devfreq_attrs:
+        attr.close()
+    _cpu_attrs.clear()
+    _devfreq_attrs.clear()
+    _gov_available.clear()
+
+
+def _apply_governor(
+    attrs: list[SysfsAttr], governor: str, kind: str
+) -> tuple[bool, bool]:
+    # Returns whether anything changed and whether every read and write worked
+    gov_bytes = GOV_BYTES.get(governor) or governor.encode()
+    pending = []
+    ok = True
+
+    for attr in attrs:
+        if _gov_state.get(attr.path) == governor:
+            continue
+        if gov_bytes not in _gov_available.get(attr.path, [gov_bytes]):
+            logging.error(f"{attr.path} does not support {governor}")
+            continue
+        try:
+            if attr.read() == gov_bytes:
+                _gov_state[attr.path] = governor
+            else:
+                pending.append(attr)
+        except Exception as e:
+            logging.error(f"Failed to read {attr.path}: {e}")
+            ok = False
+
+    # Issue all writes back to back once the stale paths are known
+    changed = 0
+    for attr in pending:
+        try:
+            # The kernel rejects unsupported governors at write time
+            attr.write(gov_bytes)
+            _gov_state[attr.path] = governor
+            changed += 1
+        except Exception as e:
+            logging.error(f"Failed to set {attr.path}: {e}")
+            ok = False
+
+    # One log record per change instead of one per path
+    if changed:
+        logging.info(f"Set {changed} {kind} governors to {governor}")
+    return bool(changed), ok
+
+
+def _load_raplctl():
+    # raplctl is installed without a .py suffix, load it from its path
+    # when it is not importable from next to this script
+    global _raplctl
+    if _raplctl is None:
+        _raplctl = False
+        try:
+            import raplctl
+
+            _raplctl = raplctl
+        except ImportError:
+            if Path(RAPLCTL_PATH).exists():
+                try:
+                    # Do not leave a __pycache__ behind in /usr/bin
+                    sys.dont_write_bytecode = True
+                    loader = importlib.machinery.SourceFileLoader(
+                        "raplctl", RAPLCTL_PATH
+                    )
+                    module = importlib.util.module_from_spec(
+                        importlib.util.spec_from_loader("raplctl", loader)
+                    )
+                    loader.exec_module(module)
+                    _raplctl = module
+                except Exception as e:
+                    logging.warning(f"Failed to load raplctl: {e}")
+    return _raplctl
+
+
+def run_raplctl(governor: str, tdps: dict) -> bool:
+    # Returns False only when limits should have been set and were not
+    if not isi:
+        return True
 
-    command = []
     if governor == "conservative_x86":
         governor = "conservative"
 
+    settings = {
+        "long": int(tdps[governor]),
+        "short": int(min(tdps[governor] * (1 + (tdps["boost"] / 100)), 900)),
+        "long_time": 300 if governor == "performance" else 20,
+    }
+
+    raplctl = _load_raplctl()
+    if raplctl:
+        # Keep raplctl's failures and output in the log, as the subprocess did
+        output = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(output):
+                applied = raplctl.set_power_limits(settings)
+        except Exception as e:
+            logging.error(f"Failed to run raplctl: {e}")
+            applied = False
+        if output.getvalue():
+            logging.info(f"raplctl output: {output.getvalue().strip()}")
+        if applied:
+            logging.info(f"Successfully ran raplctl for {governor} mode.")
+            return True
+        if applied is None:
+            # No RAPL zones to limit, nothing to retry either
+            return True
+        logging.error(f"Failed to apply raplctl limits for {governor} mode.")
+        return False
+
+    if not Path(RAPLCTL_PATH).exists():
+        return True
+
     command = [
         RAPLCTL_PATH,
         "-w",
-        f"long={int(tdps[governor])},short={int(min(tdps[governor] * (1 + (tdps['boost']/100)), 900))},long_time={300 if governor == 'performance' else 20}",
+        ",".join(f"{key}={value}" for key, value in settings.items()),
     ]
 
     try:
@@ -127,32 +363,75 @@ def run_raplctl(governor: str, tdps: dict) -> None:
             text=True,
         )
         logging.info(f"Successfully ran raplctl for {governor} mode.")
-        applied_tdp = governor
         if result.stdout:
             logging.info(f"raplctl output: {result.stdout.strip()}")
+        return True
     except subprocess.CalledProcessError as e:
         logging.error(f"Failed to run raplctl: {e}")
         if e.stderr:
             logging.error(f"raplctl error: {e.stderr.strip()}")
+        return False
+
+
+def _load_ryzenadj():
+    # libryzenadj ships with ryzenadj, keep one SMU handle for the daemon
+    global _ryzenadj
+    if _ryzenadj is None:
+        _ryzenadj = False
+        try:
+            lib = ctypes.CDLL(RYZENADJ_LIB)
+            lib.init_ryzenadj.restype = ctypes.c_void_p
+            lib.cleanup_ryzenadj.argtypes = [ctypes.c_void_p]
+            for func in (lib.set_stapm_limit, lib.set_slow_limit, lib.set_fast_limit):
+                func.argtypes = [ctypes.c_void_p, ctypes.c_uint32]
+            handle = lib.init_ryzenadj()
+            if handle:
+                _ryzenadj = (lib, handle)
+            else:
+                logging.warning("libryzenadj failed to initialize")
+        except OSError:
+            pass
+    return _ryzenadj
 
 
-def run_ryzenadj(governor: str, tdps: dict) -> None:
-    global applied_tdp
-    if not (isa and Path(RYZENADJ_PATH).exists()):
-        return
+def run_ryzenadj(governor: str, tdps: dict) -> bool:
+    # Returns False only when limits should have been set and were not
+    if not isa:
+        return True
 
-    if applied_tdp == governor:
-        return
+    ryzenadj = _load_ryzenadj()
+    if not (ryzenadj or Path(RYZENADJ_PATH).exists()):
+        return True
 
-    command = []
     if governor == "conservative_x86":
         governor = "conservative"
 
+    stapm_limit = int(tdps[governor] * 1000)
+    slow_limit = int(tdps[governor] * 1000)
+    fast_limit = int(min(tdps[governor] * (1 + (tdps["boost"] / 100)), 900)) * 100
+
+    if ryzenadj:
+        lib, handle = ryzenadj
+        errors = [
+            name
+            for name, func, value in (
+                ("stapm", lib.set_stapm_limit, stapm_limit),
+                ("slow", lib.set_slow_limit, slow_limit),
+                ("fast", lib.set_fast_limit, fast_limit),
+            )
+            if func(handle, value)
+        ]
+        if errors:
+            logging.error(f"Failed to set ryzenadj {', '.join(errors)} limit")
+            return False
+        logging.info(f"Successfully ran ryzenadj for {governor} mode.")
+        return True
+
     command = [
         RYZENADJ_PATH,
-        f"--stapm-limit={int(tdps[governor] * 1000)}",
-        f"--slow-limit={int(tdps[governor] * 1000)}",
-        f'--fast-limit={int(min(tdps[governor] * (1 + (tdps["boost"]/100)), 900)) * 100}',
+        f"--stapm-limit={stapm_limit}",
+        f"--slow-limit={slow_limit}",
+        f"--fast-limit={fast_limit}",
     ]
 
     try:
@@ -163,18 +442,23 @@ def run_ryzenadj(governor: str, tdps: dict) -> None:
             text=True,
         )
         logging.info(f"Successfully ran ryzenadj for {governor} mode.")
-        applied_tdp = governor
         if result.stdout:
             logging.info(f"ryzenadj output: {result.stdout.strip()}")
+        return True
     except subprocess.CalledProcessError as e:
         logging.error(f"Failed to run ryzenadj: {e}")
         if e.stderr:
             logging.error(f"ryzenadj error: {e.stderr.strip()}")
+        return False
 
 
 def set_governor(governor: str, tdps: dict) -> None:
-    global force_show
-    altered = False
+    global force_show, _last_applied, _tdp_applied
+    # Only set once the governor applied cleanly, load_config() clears it
+    # to force a pass
+    if governor == _last_applied:
+        return
+
     if governor not in VALID_CPU_GOVS:
         logging.error(f"Invalid CPU governor: {governor}")
 
@@ -182,155 +466,311 @@ def set_governor(governor: str, tdps: dict) -> None:
     if isx and governor == "conservative":
         governor = "powersave"
 
-    # Set tdp before governor
-    run_raplctl(effective_governor, tdps)
-    run_ryzenadj(effective_governor, tdps)
+    # Set tdp before governor, once per governor change. Failures such as
+    # BIOS-locked limits would fail every tick, so retry only after a reload
+    if effective_governor != _tdp_applied:
+        ok = run_raplctl(effective_governor, tdps)
+        ok = run_ryzenadj(effective_governor, tdps) and ok
+        if not ok:
+            logging.warning("TDP limits not fully applied, retrying on reload")
+        _tdp_applied = effective_governor
 
-    for cpu_path in Path("/sys/devices/system/cpu/").glob(
-        "cpu*/cpufreq/scaling_governor"
-    ):
-        if cpu_path.read_text().strip() != governor:
-            try:
-                cpu_path.write_text(governor)
-                if cpu_path.read_text().strip() != governor:
-                    raise Exception
-                logging.info(f"Set {cpu_path} to {governor}")
-                altered = True
-            except Exception as e:
-                logging.error(f"Failed to set {cpu_path}: {e}")
+    # CPU topology is static at runtime, only rescan after a reload
+    if not (_cpu_attrs or _devfreq_attrs):
+        _discover_paths()
 
-    devfreq_gov = "powersave" if governor == "conservative" else governor
+    altered, cpu_ok = _apply_governor(_cpu_attrs, governor, "cpufreq")
 
-    for devfreq_path in Path("/sys/class/devfreq/").glob("*/governor"):
-        if devfreq_path.read_text().strip() != devfreq_gov:
-            try:
-                devfreq_path.write_text(devfreq_gov)
-                if devfreq_path.read_text().strip() != devfreq_gov:
-                    raise Exception
-                logging.info(f"Set {devfreq_path} to {devfreq_gov}")
-                altered = True
-            except Exception as e:
-                logging.error(f"Failed to set {devfreq_path}: {e}")
+    devfreq_gov = "powersave" if governor == "conservative" else governor
+    devfreq_altered, devfreq_ok = _apply_governor(
+        _devfreq_attrs, devfreq_gov, "devfreq"
+    )
+    altered = altered or devfreq_altered
 
     if altered or force_show:
         if force_show:
             force_show = False
             time.sleep(0.5)
         logging.info(f'Applied governor "{effective_governor}"')
+        write_state(effective_governor)
+
+    # Leave governor failures unguarded so the next tick retries them
+    if cpu_ok and devfreq_ok:
+        _last_applied = effective_governor
+
+
+def write_state(governor: str) -> None:
+    # Lets the CLI read the applied governor without querying systemd
+    tmp_path = STATE_PATH + ".tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            f.write(governor)
+        os.replace(tmp_path, STATE_PATH)
+    except OSError as e:
+        logging.error(f"Failed to write {STATE_PATH}: {e}")
+
+
+def _read_attr(path: str) -> bytes:
+    fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        return os.read(fd, 64).strip()
+    finally:
+        os.close(fd)
+
+
+def _open_battery(device: str) -> BatteryDev | None:
+    # One readdir tells us which attributes exist
+    with os.scandir(device) as it:
+        names = {entry.name: entry.path for entry in it}
 
+    # Skip peripheral batteries (mice, keyboards, controllers)
+    if "scope" in names and _read_attr(names["scope"]) == b"Device":
+        return None
 
-def fetch_prop(dev: Path, attr: str) -> str:
-    dev_path = dev / attr
-    if not dev_path.exists():
-        return ""
+    dev = BatteryDev(device)
+    if "online" in names:
+        dev.online = SysfsAttr(names["online"])
 
-    return dev_path.read_text().strip()
+    if "type" in names and _read_attr(names["type"]) == b"Battery":
+        for prefix in ("energy", "charge"):
+            if f"{prefix}_full" in names and f"{prefix}_now" in names:
+                dev.full = SysfsAttr(names[f"{prefix}_full"])
+                dev.now = SysfsAttr(names[f"{prefix}_now"])
+                break
+
+    if dev.online is None and dev.full is None:
+        return None
+    return dev
+
+
+def _close_batteries() -> None:
+    global _battery_devs
+    for dev in _battery_devs or []:
+        dev.close()
+    _battery_devs = None
 
 
 def status() -> int:
+    global _battery_devs
     perc_min = 100
 
-    for device in Path(BATTERY_PATH).iterdir():
-        if ("hidpp" not in str(device)) and not (
-            str(device).startswith(BATTERY_PATH + "hid-")
-        ):
-            try:
-                energy_now = fetch_prop(device, "energy_now")
-                energy_full = fetch_prop(device, "energy_full")
+    if _battery_devs is None:
+        _battery_devs = []
+        with os.scandir(BATTERY_PATH) as it:
+            for entry in it:
+                try:
+                    dev = _open_battery(entry.path)
+                except OSError as e:
+                    logging.error(f"Failed to open device {entry.path}: {e}")
+                    continue
+                if dev is not None:
+                    _battery_devs.append(dev)
+
+    # Any supply online means external power, no need to look at batteries
+    for i, dev in enumerate(_battery_devs):
+        if dev.online is None:
+            continue
+        try:
+            if int(dev.online.read()):
+                # Check this supply first on the next tick
+                if i:
+                    _battery_devs.insert(0, _battery_devs.pop(i))
+                return 100
+        except Exception as e:
+            logging.error(f"Error parsing device {dev.path}: {e}")
+
+    for dev in _battery_devs:
+        if dev.full is None:
+            continue
+        try:
+            full = int(dev.full.read())
+            if full:
+                perc_min = min(int(dev.now.read()) * 100 // full, perc_min)
+        except Exception as e:
+            logging.error(f"Error parsing device {dev.path}: {e}")
+
+    return perc_min
+
+
+def reload() -> None:
+    global _last_status
+    _last_status = None
+    _gov_state.clear()
+    _close_gov_attrs()
+    _close_batteries()
+    if _raplctl:
+        # Pick up RAPL zones that were enabled or reloaded meanwhile
+        _raplctl.reset_caches()
+    load_config()
 
-                charge_now = fetch_prop(device, "charge_now")
 
-                charge_full = fetch_prop(device, "charge_full")
+def shutdown() -> None:
+    if _ryzenadj:
+        lib, handle = _ryzenadj
+        lib.cleanup_ryzenadj(handle)
+    _close_gov_attrs()
+    _close_batteries()
+    logging.warning("Exiting GovCtl")
+    sys.exit(0)
 
-                online = fetch_prop(device, "online")
 
-                if online and int(online):
-                    return 100
-                elif energy_full and int(energy_full):
-                    perc_min = min(
-                        (1 - ((int(energy_full) - int(energy_now)) / int(energy_full)))
-                        * 100,
-                        perc_min,
-                    )
-                elif charge_full and int(charge_full):
-                    perc_min = min(
-                        (1 - ((int(charge_full) - int(charge_now)) / int(charge_full)))
-                        * 100,
-                        perc_min,
-                    )
-            except Exception as e:
-                logging.error(f"Error parsing device {device}: {e}")
+def watch_config() -> int:
+    # Watch the directory, editors and atomic saves replace the file
+    libc = ctypes.CDLL(None, use_errno=True)
+    fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1 failed")
 
-    return int(perc_min)
+    wd = libc.inotify_add_watch(
+        fd, os.path.dirname(CONFIG_PATH).encode(), IN_CLOSE_WRITE | IN_MOVED_TO
+    )
+    if wd < 0:
+        err = ctypes.get_errno()
+        os.close(fd)
+        raise OSError(err, "inotify_add_watch failed")
 
+    return fd
 
-def reload(signum, frame) -> None:
-    global last_config_mtime
-    last_config_mtime = 0
 
+def config_changed(fd: int) -> bool:
+    changed = False
+    name = os.path.basename(CONFIG_PATH).encode()
+    while True:
+        try:
+            buf = os.read(fd, 4096)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset < len(buf):
+            _, _, _, length = INOTIFY_EVENT.unpack_from(buf, offset)
+            offset += INOTIFY_EVENT.size
+            if buf[offset : offset + length].rstrip(b"\0") == name:
+                changed = True
+            offset += length
+
+
+def watch_power_supply() -> socket.socket:
+    sock = socket.socket(
+        socket.AF_NETLINK,
+        socket.SOCK_DGRAM | socket.SOCK_NONBLOCK | socket.SOCK_CLOEXEC,
+        NETLINK_KOBJECT_UEVENT,
+    )
+    try:
+        sock.bind((0, 1))  # Kernel uevent multicast group
+    except OSError:
+        sock.close()
+        raise
+    return sock
 
-def delay() -> None:
-    period = 5 if powersave else 20
-    for _ in range(period):
-        time.sleep(1)
-        load_config()  # Check for config changes every second
-        if force_show:
-            return
 
+def power_supply_changed(sock: socket.socket) -> bool:
+    global _last_status
+    changed = False
+    while True:
+        try:
+            msg = sock.recv(8192)
+        except BlockingIOError:
+            break
+        except OSError as e:
+            if e.errno != errno.ENOBUFS:
+                raise
+            # The kernel dropped events, we cannot tell which, rescan everything
+            logging.warning("Power supply events overflowed, rescanning")
+            changed = True
+            _close_batteries()
+            continue
 
-def read_phys_mem_word(address: int) -> int:
-    cmd = ["devmem2", hex(address), "w"]
-    try:
-        output = subprocess.check_output(cmd, stderr=subprocess.STDOUT).decode()
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"devmem2 failed: {e.output.decode()}") from e
+        fields = msg.split(b"\0")
+        if b"SUBSYSTEM=power_supply" not in fields:
+            continue
 
-    match = re.search(r"Value at address.*: (0x[0-9A-Fa-f]+)", output)
-    if not match:
-        raise ValueError("Could not parse devmem2 output")
+        changed = True
+        if not fields[0].startswith(b"change@"):
+            # Supply added or removed, rebuild the device list
+            _close_batteries()
 
-    return int(match.group(1), 16)
+    if changed:
+        _last_status = None
+    return changed
 
 
-def write_phys_mem_word(address, value):
-    cmd = ["devmem2", hex(address), "w", hex(value)]
-    try:
-        subprocess.check_output(cmd, stderr=subprocess.STDOUT)
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"devmem2 write failed: {e.output.decode()}") from e
+def handle_signal(signum, frame) -> None:
+    # Nothing to do here, the wakeup fd hands the signal to delay()
+    pass
+
 
+def delay(period: int | None = None) -> None:
+    # Sleep the whole period, a signal, config or power supply change
+    # wakes us up early
+    if period is None:
+        period = UEVENT_PERIOD if _uevent_sock else (5 if powersave else 20)
 
-def read_msr(address):
-    cmd = ["rdmsr", "--hexadecimal", "--zero-pad", "--c-language", hex(address)]
+    for fd, _ in _epoll.poll(period):
+        if fd == _wake_r:
+            try:
+                signums = os.read(_wake_r, 64)
+            except BlockingIOError:
+                continue
+            if signal.SIGTERM in signums:
+                shutdown()
+            if signal.SIGHUP in signums:
+                reload()
+        elif fd == _inotify_fd:
+            if config_changed(_inotify_fd):
+                load_config()
+        elif _uevent_sock and fd == _uevent_sock.fileno():
+            power_supply_changed(_uevent_sock)
+
+
+def map_phys_mem(address: int, length: int) -> tuple[mmap.mmap, int]:
+    # Map the page(s) holding address, returns the map and the offset into it
+    page = address & ~(mmap.PAGESIZE - 1)
+    offset = address - page
+    fd = os.open("/dev/mem", os.O_RDWR | os.O_SYNC | os.O_CLOEXEC)
     try:
-        output = subprocess.check_output(cmd, stderr=subprocess.STDOUT).decode().strip()
-        return int(output, 16)
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"rdmsr failed: {e.output.decode()}") from e
+        mm = mmap.mmap(
+            fd,
+            offset + length,
+            mmap.MAP_SHARED,
+            mmap.PROT_READ | mmap.PROT_WRITE,
+            offset=page,
+        )
+    finally:
+        os.close(fd)
+    return mm, offset
 
 
-def write_msr(address, value):
-    """Writes a value to an MSR using wrmsr."""
-    cmd = ["wrmsr", hex(address), hex(value)]
-    try:
-        subprocess.check_output(cmd, stderr=subprocess.STDOUT)
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"wrmsr failed: {e.output.decode()}") from e
+def _msr_rw(fd: int, address: int, newval: int | None = None) -> int:
+    # Package RAPL is shared, so cpu 0's MSR file covers it
+    if newval is not None:
+        os.pwrite(fd, newval.to_bytes(8, "little"), address)
+        return newval
+    return int.from_bytes(os.pread(fd, 8, address), "little")
+
+
+def open_msr() -> int:
+    if not os.access(MSR_PATH, os.R_OK | os.W_OK):
+        subprocess.run(["modprobe", "msr"], check=False)
+    return os.open(MSR_PATH, os.O_RDWR | os.O_CLOEXEC)
 
 
 def enable_msr_limits():
-    msr_val = read_msr(INTEL_MSR_PKG_POWER_LIMIT)
+    fd = open_msr()
+    try:
+        msr_val = _msr_rw(fd, INTEL_MSR_PKG_POWER_LIMIT)
 
-    if (msr_val & INTEL_PL1_PL2_ENABLE_BITS) != INTEL_PL1_PL2_ENABLE_BITS:
-        print("Enabling PL1 and PL2 bits in MSR...")
-        new_val = msr_val | INTEL_PL1_PL2_ENABLE_BITS
-        write_msr(INTEL_MSR_PKG_POWER_LIMIT, new_val)
+        if (msr_val & INTEL_PL1_PL2_ENABLE_BITS) != INTEL_PL1_PL2_ENABLE_BITS:
+            print("Enabling PL1 and PL2 bits in MSR...")
+            new_val = msr_val | INTEL_PL1_PL2_ENABLE_BITS
+            _msr_rw(fd, INTEL_MSR_PKG_POWER_LIMIT, new_val)
+    finally:
+        os.close(fd)
 
 
 def get_mchbar_address():
-    cmd = ["setpci", "-s", "00:00.0", "48.l"]
-    output = subprocess.check_output(cmd).decode().strip()
-    mchbar = int(output, 16)
+    with open(HOST_BRIDGE_CONFIG, "rb") as f:
+        mchbar = struct.unpack("<I", os.pread(f.fileno(), 4, 0x48))[0]
 
     # Check enable bit (bit 0)
     if not (mchbar & 1):
@@ -344,41 +784,41 @@ def disable_mmio_limits() -> None:
     mchbar = get_mchbar_address()
     rapl_addr = mchbar + INTEL_PACKAGE_RAPL_LIMIT_0_0_0_MCHBAR_PCU
 
-    # Read current 64-bit value (split into two 32-bit reads)
-    low = read_phys_mem_word(rapl_addr)
-    high = read_phys_mem_word(rapl_addr + 4)
+    mm, offset = map_phys_mem(rapl_addr, 8)
+    # Fixed-width views keep each access a single aligned 32-bit MMIO cycle,
+    # like devmem2, struct would touch the register a byte at a time
+    with mm, memoryview(mm) as buf, buf.cast("I") as regs:
+        idx = offset // 4
 
-    if (not low) and (not high):
-        return
+        # Read current 64-bit value (two 32-bit reads, low dword first)
+        low = regs[idx]
+        high = regs[idx + 1]
+        val = (high << 32) | low
 
-    print(f"Current MMIO RAPL Limit: 0x{high:08x}:0x{low:08x}")
+        if not val:
+            return
 
-    # Check lock bit (bit 31 of high word)
-    is_locked = (high & 0x80000000) != 0
+        print(f"Current MMIO RAPL Limit: 0x{high:08x}:0x{low:08x}")
 
-    if is_locked:
-        pl1_active = low & INTEL_PL1_ENABLE_BITS_LOW
-        pl2_active = high & INTEL_PL2_ENABLE_BITS_HIGH
+        # Check lock bit (bit 63)
+        is_locked = val & (1 << 63)
 
-        if pl1_active or pl2_active:
-            print("Warning: MMIO is locked and limits are enabled. Cannot override.")
-            raise RuntimeError
-    else:
-        print("MMIO not locked. Zeroing out register to disable MMIO limits.")
-        write_phys_mem_word(rapl_addr, 0x00000000)
-        write_phys_mem_word(rapl_addr + 4, 0x00000000)
+        if is_locked:
+            if val & INTEL_PL1_PL2_ENABLE_BITS:
+                print(
+                    "Warning: MMIO is locked and limits are enabled. Cannot override."
+                )
+                raise RuntimeError
+        else:
+            print("MMIO not locked. Zeroing out register to disable MMIO limits.")
+            regs[idx] = 0x00000000
+            regs[idx + 1] = 0x00000000
 
 
 def try_uncap_power() -> None:
-    if PL_UNCAP_MISSING:
-        logging.warning("Binaries missing for power limit uncap!")
-        logging.warning("---------------------------------------")
-        for i in PL_UNCAP_MISSING:
-            logging.warning(f" - {i}")
-        logging.warning("---------------------------------------")
-        return
-    else:
-        logging.info("PL uncap will be attempted.")
+    # Everything goes through /dev/cpu/0/msr, sysfs PCI config and /dev/mem,
+    # no external tools needed
+    logging.info("PL uncap will be attempted.")
     try:
         enable_msr_limits()
         disable_mmio_limits()
@@ -389,21 +829,40 @@ def try_uncap_power() -> None:
 
 def main():
     logging.info("Starting GovCtl")
-    global force_show, powersave
-
-    signal.signal(signal.SIGHUP, reload)
+    global force_show, powersave, _last_status, _last_status_ts
+    global _wake_r, _wake_w, _inotify_fd, _uevent_sock, _epoll
+
+    # Signals are only queued on the wakeup fd and handled in delay()
+    _wake_r, _wake_w = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+    signal.set_wakeup_fd(_wake_w)
+    signal.signal(signal.SIGHUP, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+    _epoll = select.epoll()
+    _epoll.register(_wake_r, select.EPOLLIN)
     load_config()
 
+    try:
+        _inotify_fd = watch_config()
+    except OSError as e:
+        logging.warning(f"Cannot watch config for changes: {e}")
+    else:
+        _epoll.register(_inotify_fd, select.EPOLLIN)
+
+    try:
+        _uevent_sock = watch_power_supply()
+    except OSError as e:
+        logging.warning(f"Cannot watch power supply events, polling instead: {e}")
+    else:
+        _epoll.register(_uevent_sock, select.EPOLLIN)
+
     if isi:
         try_uncap_power()
 
     while True:
-        # Also check config at the start of every loop
-        load_config()
-
         if not current_config:
             logging.warning("Config could not be loaded, retrying in 10s.")
-            time.sleep(10)
+            delay(10)
+            load_config()
             continue
 
         desired_governor = current_config.get("governor", "performance")
@@ -434,7 +893,21 @@ def main():
                     validated_tdps[key] = default_value
             tdps = validated_tdps
 
-        st = status() if detect_battery else 100
+        if not detect_battery:
+            st = 100
+        elif (
+            _uevent_sock
+            and _last_status is not None
+            and time.monotonic() - _last_status_ts < UEVENT_PERIOD
+        ):
+            # Only rescan once a power supply uevent has cleared the status
+            st = _last_status
+        elif _last_status == 100 and time.monotonic() - _last_status_ts < 2:
+            st = _last_status
+        else:
+            st = status()
+            _last_status = st
+            _last_status_ts = time.monotonic()
 
         if powersave:
             if st < (powersave_point + 10):
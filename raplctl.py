@@ -1,208 +1,610 @@
 #!/usr/bin/env python3
 import argparse
+import ctypes
+import errno
 import os
-import subprocess
-from collections import defaultdict
+import re
+import select
+import struct
+import sys
+import time
 
 RAPL_PATH = "/sys/class/powercap/intel-rapl"
+PERF_PMU_PATH = "/sys/bus/event_source/devices/power"
+CONSTRAINT_NAMES = ("long", "short", "peak")
+# Constraint names as the kernel reports them
+NAME_MAP = {b"long_term": "long", b"short_term": "short", b"peak_power": "peak"}
+# perf_event_open(2), RAPL only exists on x86_64 here
+_NR_PERF_EVENT_OPEN = 298
+_PERF_FLAG_FD_CLOEXEC = 8
+_PERF_ATTR_SIZE = 64
+# inotify(7)
+_IN_MODIFY = 0x00000002
+_INOTIFY_EVENT = struct.Struct("iIII")
+_IS_ROOT = os.geteuid() == 0
+# An energy_uj read slower than this marks sysfs as slow for the process
+_SLOW_SYSFS_NS = 500_000
+PAIR_RE = re.compile(r"([A-Za-z_]+)=([\d.]+)")
+SUFFIX_UNIT = (("energy_uj", "J"), ("_uw", "W"), ("_us", "s"))
+_ALLOWED_KEYS = frozenset(
+    CONSTRAINT_NAMES + tuple(f"{name}_time" for name in CONSTRAINT_NAMES)
+)
+
+# Layout caches, filled on first use and kept for the process lifetime
+_topology = None
+_enabled_devices = None
+_fd_cache = {}
+_perf_fds = None
+_slow_sysfs = None
+
+
+def _scan_topology():
+    # One walk over every device: its regular files and constraint names
+    topology = {}
+    with os.scandir(RAPL_PATH) as it:
+        devices = sorted(
+            (e.name, e.path)
+            for e in it
+            if e.name.startswith("intel-rapl:") and e.is_dir(follow_symlinks=False)
+        )
+    for device, device_path in devices:
+        with os.scandir(device_path) as it:
+            files = sorted(
+                (e.name, e.path) for e in it if e.is_file(follow_symlinks=False)
+            )
+        cmap = {}
+        for item, path in files:
+            if not item.endswith("_name"):
+                continue
+            kind = NAME_MAP.get(_read_raw(path))
+            if kind:
+                cmap[kind] = f"constraint_{item.split('_')[1]}"
+        topology[device] = {
+            "constraint_map": cmap,
+            "path": device_path,
+            "files": files,
+        }
+    return topology
 
 
-def format_value(num):
-    # Formats a float to remove unnecessary trailing zeros.
-    if num == int(num):
-        return str(int(num))
-    return f"{num:g}"
+def get_topology():
+    """Returns the RAPL layout, scanned once per process."""
+    global _topology
+    if _topology is None:
+        _topology = _scan_topology()
+    return _topology
 
 
-def write_value(path, value):
+def _have_rapl():
+    # EAFP: the topology scan fails if intel-rapl is missing, no separate stat
     try:
-        with open(path, "w") as f:
-            f.write(str(value))
-    except PermissionError:
-        print(f"Failed to write to {path}")
+        get_topology()
+    except FileNotFoundError:
+        print(f"Intel RAPL directory not found at {RAPL_PATH}. Exiting.")
         return False
-    except Exception as e:
-        print(f"An unexpected error occurred while writing to {path}: {e}")
+    return True
+
+
+def rapl_devices():
+    """Returns the sorted intel-rapl:* device names."""
+    return list(get_topology())
+
+
+def enabled_devices():
+    """Returns the devices whose enabled attribute reads 1."""
+    global _enabled_devices
+    if _enabled_devices is None:
+        _enabled_devices = []
+        for d, layout in get_topology().items():
+            if _is_enabled(f"{layout['path']}/enabled"):
+                _enabled_devices.append(d)
+    return _enabled_devices
+
+
+def listed_devices():
+    """Returns the devices to list, all but those whose enabled reads 0."""
+    return [
+        d
+        for d, layout in get_topology().items()
+        if _enabled_byte(f"{layout['path']}/enabled") != b"0"
+    ]
+
+
+def constraint_map(device):
+    """Maps long/short/peak to the device's constraint_N prefix."""
+    return get_topology()[device]["constraint_map"]
+
+
+def _open_constraint(device, attr):
+    # Keep the write fd open, the daemon rewrites the same files on every switch
+    key = (device, attr)
+    fd = _fd_cache.get(key)
+    if fd is None:
+        path = f"{get_topology()[device]['path']}/{attr}"
+        fd = os.open(path, os.O_WRONLY | os.O_CLOEXEC)
+        _fd_cache[key] = fd
+    return fd
+
+
+def reset_caches():
+    """Closes the held fds and forgets the layout, it is rescanned on next use."""
+    global _topology, _enabled_devices
+    for fd in _fd_cache.values():
+        os.close(fd)
+    _fd_cache.clear()
+    _topology = None
+    _enabled_devices = None
+
+
+def write_value(device, attr, value, data=None):
+    data = data or str(value).encode()
+    try:
+        try:
+            os.pwrite(_open_constraint(device, attr), data, 0)
+        except OSError as e:
+            if e.errno != errno.ENODEV:
+                raise
+            # The zone went away under us (driver reload), reopen once
+            os.close(_fd_cache.pop((device, attr)))
+            os.pwrite(_open_constraint(device, attr), data, 0)
+    except FileNotFoundError:
+        print(f"  Warning: Path not found: {device}/{attr}")
+        return False
+    except OSError as e:
+        # Non-root callers never get here, set_power_limits refuses them up front
+        print(f"Failed to write to {device}/{attr}: {e}")
         return False
     return True
 
 
+def write_many(pairs):
+    """Writes (device, attr, value) triples, returns a success flag for each."""
+    encoded = {}
+    results = []
+    for device, attr, value in pairs:
+        if value not in encoded:
+            encoded[value] = str(value).encode()
+        results.append(write_value(device, attr, value, encoded[value]))
+    return results
+
+
+def _read_raw(path):
+    # One read(2) is enough for any RAPL attribute, skip the buffered file object
+    fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        return os.read(fd, 256).rstrip()
+    finally:
+        os.close(fd)
+
+
+def _enabled_byte(path):
+    # Only the first byte of an enabled attribute matters, None if unreadable
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    except OSError:
+        return None
+    try:
+        return os.read(fd, 1)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+
+def _is_enabled(path):
+    return _enabled_byte(path) == b"1"
+
+
+def _read_int_or_bytes(path):
+    # Returns (int, raw) for integer attributes, (None, raw) otherwise
+    data = _read_raw(path)
+    try:
+        return int(data), data
+    except ValueError:
+        return None, data
+
+
 def read_and_format_file(file_path):
     # Reads a file, formats the value to SI units, and returns it.
     try:
-        with open(file_path, "r") as f:
-            value = f.read().strip()
-            if value.isdigit():
-                num_value = int(value)
-                filename = os.path.basename(file_path)
-                if "energy_uj" in filename:
-                    return f"{format_value(num_value / 1_000_000)} J"
-                if "_uw" in filename:
-                    return f"{format_value(num_value / 1_000_000)} W"
-                if "_us" in filename:
-                    return f"{format_value(num_value / 1_000_000)} s"
-            return value
+        num_value, data = _read_int_or_bytes(file_path)
     except (IOError, OSError):
         return None
+    if num_value is not None and num_value >= 0:
+        for suffix, unit in SUFFIX_UNIT:
+            if file_path.endswith(suffix):
+                # Micro units to SI, without going through float
+                q, r = divmod(num_value, 1_000_000)
+                if not r:
+                    return f"{q} {unit}"
+                return f"{q}.{r:06d}".rstrip("0") + f" {unit}"
+    return data.decode(errors="replace")
+
+
+def _parse_cpumask(mask):
+    # "0" or "0,28" or "0-1" style cpu lists
+    cpus = []
+    for part in mask.split(b","):
+        first, _, last = part.partition(b"-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def _open_perf_events():
+    # One counter per power PMU event and package, {label: (fd, scale)}
+    pmu_type = int(_read_raw(f"{PERF_PMU_PATH}/type"))
+    cpus = _parse_cpumask(_read_raw(f"{PERF_PMU_PATH}/cpumask"))
+    libc = ctypes.CDLL(None, use_errno=True)
+
+    with os.scandir(f"{PERF_PMU_PATH}/events") as it:
+        events = sorted((e.name, e.path) for e in it if "." not in e.name)
+
+    fds = {}
+    try:
+        for name, path in events:
+            # The event file reads like "event=0x02"
+            config = int(_read_raw(path).partition(b"=")[2], 0)
+            scale = float(_read_raw(f"{path}.scale"))
+            attr = ctypes.create_string_buffer(
+                struct.pack("<IIQ", pmu_type, _PERF_ATTR_SIZE, config),
+                _PERF_ATTR_SIZE,
+            )
+            for cpu in cpus:
+                fd = libc.syscall(
+                    _NR_PERF_EVENT_OPEN, attr, -1, cpu, -1, _PERF_FLAG_FD_CLOEXEC
+                )
+                if fd < 0:
+                    err = ctypes.get_errno()
+                    raise OSError(err, f"perf_event_open {name}: {os.strerror(err)}")
+                label = name if len(cpus) == 1 else f"{name} (cpu {cpu})"
+                fds[label] = (fd, scale)
+    except BaseException:
+        for fd, _ in fds.values():
+            os.close(fd)
+        raise
+    return fds
+
+
+def read_perf_energies():
+    """Returns joules counted per power PMU event since the counters were opened."""
+    global _perf_fds
+    if _perf_fds is None:
+        _perf_fds = _open_perf_events()
+    return {
+        label: struct.unpack("<Q", os.read(fd, 8))[0] * scale
+        for label, (fd, scale) in _perf_fds.items()
+    }
+
+
+def _read_sysfs_energies():
+    # Fallback for callers without CAP_PERFMON, energy_uj of each enabled device
+    energies = {}
+    for rapl_dir in enabled_devices():
+        num_value, _ = _read_int_or_bytes(
+            f"{get_topology()[rapl_dir]['path']}/energy_uj"
+        )
+        if num_value is not None:
+            energies[rapl_dir] = num_value / 1_000_000
+    return energies
 
 
-def list_power_limits():
-    if not os.path.isdir(RAPL_PATH):
-        print("intel-rapl directory not found. Exiting.")
+def sample_energy(interval=1.0):
+    """Prints the energy used and average power over interval seconds."""
+    try:
+        read = read_perf_energies
+        before = read()
+    except (OSError, ValueError) as e:
+        print(f"perf power events unavailable ({e}), using sysfs counters.")
+        if not _have_rapl():
+            return
+        read = _read_sysfs_energies
+        try:
+            before = read()
+        except PermissionError:
+            # energy_uj is root-only since Linux 5.10
+            print("Reading energy counters needs root or CAP_PERFMON.")
+            return
+        except OSError as e:
+            print(f"Failed to read sysfs energy counters: {e}")
+            return
+
+    time.sleep(interval)
+    try:
+        after = read()
+    except OSError as e:
+        print(f"Failed to read energy counters: {e}")
         return
 
-    for rapl_dir in sorted(os.listdir(RAPL_PATH)):
-        rapl_full_path = os.path.join(RAPL_PATH, rapl_dir)
-        if not (os.path.isdir(rapl_full_path) and rapl_dir.startswith("intel-rapl:")):
+    for label, joules in after.items():
+        used = joules - before.get(label, joules)
+        if used < 0:
+            # sysfs energy_uj wrapped around during the sample
             continue
+        print(f"{label}: {used:.3f} J, {used / interval:.2f} W")
 
-        # Check if the device is enabled
-        enabled_path = os.path.join(rapl_full_path, "enabled")
-        if os.path.exists(enabled_path):
-            with open(enabled_path, "r") as f:
-                if f.read().strip() == "0":
-                    continue  # Skip disabled devices
 
-        print(f"Device: {rapl_dir}")
+def _watch_limits(libc, devices):
+    # inotify fd watching the device dirs, sysfs only reports writes from userspace
+    ifd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if ifd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+    wds = {}
+    topology = get_topology()
+    for device in devices:
+        wd = libc.inotify_add_watch(ifd, topology[device]["path"].encode(), _IN_MODIFY)
+        if wd >= 0:
+            wds[wd] = device
+    return ifd, wds
 
-        files = sorted(os.listdir(rapl_full_path))
-        constraints = defaultdict(dict)
-        other_params = {}
 
-        # Collect and group all parameters
-        for item in files:
-            full_item_path = os.path.join(rapl_full_path, item)
-            if not os.path.isfile(full_item_path):
-                continue
+def snapshot(fds):
+    """Returns the current energy_uj counter behind each held fd."""
+    return [int(os.pread(fd, 32, 0)) for fd in fds]
 
-            value = read_and_format_file(full_item_path)
-            if value is None:
+
+def watch_power(interval=1.0):
+    """Prints average power every interval, and limits as other tools change them."""
+    if not _have_rapl():
+        return
+    devices = enabled_devices()
+    if not devices:
+        print("No enabled RAPL devices found to watch.")
+        return
+    topology = get_topology()
+    libc = ctypes.CDLL(None, use_errno=True)
+
+    # Held energy_uj fds and their wrap-around ranges, in device order
+    fds = []
+    ranges = []
+    try:
+        for device in devices:
+            path = topology[device]["path"]
+            fds.append(os.open(f"{path}/energy_uj", os.O_RDONLY | os.O_CLOEXEC))
+            try:
+                ranges.append(int(_read_raw(f"{path}/max_energy_range_uj")))
+            except (OSError, ValueError):
+                ranges.append(0)
+        prev = snapshot(fds)
+    except OSError as e:
+        for fd in fds:
+            os.close(fd)
+        if isinstance(e, PermissionError):
+            # energy_uj is root-only since Linux 5.10
+            print("Watching power needs root, energy_uj is not readable.")
+        else:
+            print(f"Failed to open energy counters: {e}")
+        return
+
+    # Last shown value per (device, file), re-read only when inotify says so
+    values = {
+        (device, item): read_and_format_file(path)
+        for device in devices
+        for item, path in topology[device]["files"]
+        if item != "energy_uj"
+    }
+
+    epoll = select.epoll()
+    try:
+        ifd, wds = _watch_limits(libc, devices)
+    except OSError as e:
+        print(f"Not watching limit changes: {e}")
+        ifd, wds = None, {}
+    else:
+        epoll.register(ifd, select.EPOLLIN)
+
+    last = time.monotonic()
+    deadline = last + interval
+    try:
+        while True:
+            if epoll.poll(max(deadline - time.monotonic(), 0)):
+                try:
+                    data = os.read(ifd, 4096)
+                except BlockingIOError:
+                    data = b""
+                offset = 0
+                while offset < len(data):
+                    wd, _, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+                    offset += _INOTIFY_EVENT.size
+                    item = data[offset : offset + length].rstrip(b"\0").decode()
+                    offset += length
+                    device = wds.get(wd)
+                    if (device, item) not in values:
+                        continue
+                    new = read_and_format_file(f"{topology[device]['path']}/{item}")
+                    if new != values[(device, item)]:
+                        print(f"{device} {item}: {values[(device, item)]} -> {new}")
+                        values[(device, item)] = new
+
+            now = time.monotonic()
+            if now < deadline:
                 continue
+            cur = snapshot(fds)
+            readings = []
+            for device, before, after, max_range in zip(devices, prev, cur, ranges):
+                delta = (
+                    after - before if after >= before else after + max_range - before
+                )
+                readings.append(f"{device}: {delta / 1_000_000 / (now - last):.2f} W")
+            print("  ".join(readings))
+            prev = cur
+            last = now
+            deadline = now + interval
+    except KeyboardInterrupt:
+        pass
+    finally:
+        epoll.close()
+        if ifd is not None:
+            os.close(ifd)
+        for fd in fds:
+            os.close(fd)
 
-            if item.startswith("constraint_"):
-                parts = item.split("_", 2)
-                if len(parts) == 3:
-                    constraint_id = parts[1]
-                    key = parts[2]
-                    constraints[constraint_id][key] = value
-            else:
-                other_params[item] = value
 
-        # Print other parameters first
-        for key in sorted(other_params.keys()):
-            if other_params[key]:
-                print(f"  {key}: {other_params[key]}")
+def list_power_limits():
+    global _slow_sysfs
+    if not _have_rapl():
+        return
 
-        # Print constraint blocks
-        for constraint_id in sorted(constraints.keys()):
-            constraint_data = constraints[constraint_id]
-            name = constraint_data.pop("name", f"Unnamed Constraint {constraint_id}")
+    # Collect the whole listing and write it out once
+    out = []
+    # Zones without an enabled attribute are still listed, only writes need it
+    for rapl_dir in listed_devices():
+        out.append(f"Device: {rapl_dir}\n")
+
+        # Constraint files sort together by id, so group them as they stream by.
+        # Each block is [id, name, [(key, value), ...]]
+        constraints = []
+        block = None
+        for item, path in get_topology()[rapl_dir]["files"]:
+            if item == "energy_uj":
+                # Some platforms stall on energy reads, time the first one
+                if _slow_sysfs:
+                    continue
+                start = time.perf_counter_ns()
+                value = read_and_format_file(path)
+                if _slow_sysfs is None:
+                    _slow_sysfs = time.perf_counter_ns() - start > _SLOW_SYSFS_NS
+                    if _slow_sysfs:
+                        out.append(
+                            "  Slow sysfs detected, skipping further energy reads\n"
+                        )
+            else:
+                value = read_and_format_file(path)
+            if value is None:
+                continue
 
-            # Skip empty constraints
-            if not any(constraint_data.values()):
+            if item.startswith("constraint_"):
+                rest = item[11:]
+                sep = rest.find("_")
+                if sep < 0:
+                    continue
+                if block is None or rest[:sep] != block[0]:
+                    cid = rest[:sep]
+                    block = [cid, f"Unnamed Constraint {cid}", []]
+                    constraints.append(block)
+                key = rest[sep + 1 :]
+                if key == "name":
+                    block[1] = value
+                elif value:
+                    block[2].append((key, value))
+            elif value:
+                # Other parameters are printed first
+                out.append(f"  {item}: {value}\n")
+
+        # Print constraint blocks, skipping empty ones
+        for constraint_id, name, params in constraints:
+            if not params:
                 continue
 
-            print(f"\n  {name} (constraint {constraint_id}):")
-            for key in sorted(constraint_data.keys()):
-                if constraint_data[key]:
-                    print(f"    {key}: {constraint_data[key]}")
+            out.append(f"\n  {name} (constraint {constraint_id}):\n")
+            for key, value in params:
+                out.append(f"    {key}: {value}\n")
 
-        print()
+        out.append("\n")
 
+    sys.stdout.write("".join(out))
 
-def set_power_limits(rule, device=None):
-    """Sets power limits based on a rule string, with robust error handling."""
-    if not os.path.isdir(RAPL_PATH):
-        print("Intel RAPL directory not found. Exiting.")
-        return
 
-    try:
-        settings = {
-            k.lower(): v for k, v in (item.split("=") for item in rule.split(","))
-        }
-    except ValueError:
+def parse_rule(rule):
+    """Parses a rule string into a settings dict, None if malformed."""
+    pairs = PAIR_RE.findall(rule)
+    if not pairs or ",".join(f"{k}={v}" for k, v in pairs) != rule.strip():
         print(
             "Invalid rule format. Use: long=75,long_time=28,short=90,short_time=0.002"
         )
-        return
+        return None
+    return {k.lower(): v for k, v in pairs}
 
-    all_rapl_dirs = sorted(
-        [d for d in os.listdir(RAPL_PATH) if d.startswith("intel-rapl:")]
-    )
 
-    target_dirs = []
+def set_power_limits(settings, device=None):
+    """Sets power limits from a settings dict, with robust error handling.
+
+    Returns True if every setting was written to every target device,
+    None if there was nothing to write to (no RAPL or no enabled device)."""
+    if not _have_rapl():
+        return None
+
+    if not _IS_ROOT:
+        print("Writing RAPL power limits requires root permissions.")
+        return False
+
+    unknown = [key for key in settings if key not in _ALLOWED_KEYS]
+    if unknown:
+        for key in unknown:
+            print(f"Warning: Unknown setting '{key}'.")
+        return False
+
     if device:
-        if device in all_rapl_dirs:
-            target_dirs.append(device)
+        if device in rapl_devices():
+            target_dirs = [device]
         else:
             print(f"Error: Device '{device}' not found.")
-            return
+            return False
     else:
         # Default to all enabled devices
-        for d in all_rapl_dirs:
-            enabled_path = os.path.join(RAPL_PATH, d, "enabled")
-            if os.path.exists(enabled_path):
-                with open(enabled_path, "r") as f:
-                    if f.read().strip() == "1":
-                        target_dirs.append(d)
+        target_dirs = enabled_devices()
 
     if not target_dirs:
         print("No enabled RAPL devices found to apply settings to.")
-        return
+        return None
 
+    # Convert values once, they are the same for every device
+    success = True
+    values = {}
+    for key, value_str in settings.items():
+        try:
+            values[key] = int(float(value_str) * 1_000_000)
+        except ValueError:
+            print(f"Invalid numeric value for {key}: '{value_str}'")
+            success = False
+
+    # Plan every write across all devices, then issue them in one batch
+    plan = []
+    notes = {rapl_dir: [] for rapl_dir in target_dirs}
     for rapl_dir in target_dirs:
+        cmap = constraint_map(rapl_dir)
+        for key in values:
+            constraint_name = key[:-5] if key.endswith("_time") else key
+            if constraint_name not in cmap:
+                notes[rapl_dir].append(
+                    f"  Warning: {rapl_dir} has no {constraint_name} constraint."
+                )
+                success = False
+            elif key.endswith("_time"):
+                attr = f"{cmap[constraint_name]}_time_window_us"
+                plan.append((rapl_dir, attr, key, "s"))
+            else:
+                attr = f"{cmap[constraint_name]}_power_limit_uw"
+                plan.append((rapl_dir, attr, key, "W"))
+
+    results = write_many(
+        (rapl_dir, attr, values[key]) for rapl_dir, attr, key, _ in plan
+    )
+    for (rapl_dir, _, key, unit), ok in zip(plan, results):
+        if ok:
+            notes[rapl_dir].append(f"  Set {key} to {settings[key]}{unit}")
+        else:
+            notes[rapl_dir].append(f"  Skipped setting {key} due to write error.")
+            success = False
+
+    for rapl_dir, lines in notes.items():
         print(f"Applying settings to {rapl_dir}:")
-        rapl_full_path = os.path.join(RAPL_PATH, rapl_dir)
-
-        # Dynamically build constraint map for the device
-        constraint_map = {}
-        for item in os.listdir(rapl_full_path):
-            if item.endswith("_name"):
-                name_path = os.path.join(rapl_full_path, item)
-                with open(name_path, "r") as f:
-                    name = f.read().strip()
-                constraint_id = item.split("_")[1]
-                if "long" in name:
-                    constraint_map["long"] = f"constraint_{constraint_id}"
-                elif "short" in name:
-                    constraint_map["short"] = f"constraint_{constraint_id}"
-                elif "peak" in name:
-                    constraint_map["peak"] = f"constraint_{constraint_id}"
-
-        for key, value_str in settings.items():
-            try:
-                path_suffix = None
-                value_to_write = 0
-                unit = ""
-
-                if key.endswith("_time"):
-                    constraint_name = key[:-5]
-                    if constraint_name in constraint_map:
-                        path_suffix = (
-                            f"{constraint_map[constraint_name]}_time_window_us"
-                        )
-                        value_to_write = int(float(value_str) * 1_000_000)
-                        unit = "s"
-                elif key in constraint_map:
-                    path_suffix = f"{constraint_map[key]}_power_limit_uw"
-                    value_to_write = int(float(value_str) * 1_000_000)
-                    unit = "W"
-
-                if path_suffix:
-                    path = os.path.join(rapl_full_path, path_suffix)
-                    if os.path.exists(path):
-                        if not write_value(path, value_to_write):
-                            print(f"  Skipped setting {key} due to write error.")
-                        else:
-                            print(f"  Set {key} to {value_str}{unit}")
-                    else:
-                        print(f"  Warning: Path not found, cannot set {key}: {path}")
-                else:
-                    print(f"  Warning: Unknown setting '{key}'. Skipping.")
-            except ValueError:
-                print(f"  Invalid numeric value for {key}: '{value_str}'")
-            except Exception as e:
-                print(f"  An unexpected error occurred while setting {key}: {e}")
+        for line in lines:
+            print(line)
+
+    return success
+
+
+def _positive_float(value):
+    # argparse type for --watch, a zero or negative interval would busy-loop
+    try:
+        interval = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid interval: '{value}'")
+    if not 0 < interval < float("inf"):
+        raise argparse.ArgumentTypeError(
+            f"interval must be a positive, finite number: '{value}'"
+        )
+    return interval
 
 
 def main():
@@ -227,6 +629,23 @@ def main():
         "Applies to all enabled devices by default.\n"
         'Example: -w "long=75,long_time=28,short=90"',
     )
+    parser.add_argument(
+        "-p",
+        "--perf",
+        action="store_true",
+        help="Measure energy use over one second with the perf power events.\n"
+        "Needs root or CAP_PERFMON, without perf support root can still\n"
+        "fall back to the sysfs energy_uj counters.",
+    )
+    parser.add_argument(
+        "--watch",
+        type=_positive_float,
+        nargs="?",
+        const=1.0,
+        metavar="SECONDS",
+        help="Print average power every SECONDS (default 1) until interrupted,\n"
+        "along with any power limit another tool changes meanwhile.",
+    )
     parser.add_argument(
         "-d",
         "--device",
@@ -237,14 +656,16 @@ def main():
 
     args = parser.parse_args()
 
-    if not os.path.isdir(RAPL_PATH):
-        print(f"Intel RAPL directory not found at {RAPL_PATH}. Aborting.")
-        return
-
     if args.list:
         list_power_limits()
     elif args.write:
-        set_power_limits(args.write, args.device)
+        settings = parse_rule(args.write)
+        if settings is not None:
+            set_power_limits(settings, args.device)
+    elif args.perf:
+        sample_energy()
+    elif args.watch is not None:
+        watch_power(args.watch)
     else:
         parser.print_help()
 